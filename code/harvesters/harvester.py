@@ -1,23 +1,27 @@
-import requests
+import argparse
 import dotenv
-import json
-import time
+import orjson
 import os
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
 import record_detail
 
 dotenv.load_dotenv()
 
 class Europeana:
-    def __init__(self):
+    def __init__(self, max_workers=8, refresh=False):
         self.api_key = dotenv.get_key(
             dotenv.find_dotenv(),
             "EUROPEANA_API_KEY"
         )
+        self.max_workers = max_workers
+        # One keep-alive pool shared by search and record detail calls
+        self.session = record_detail.build_session(self.api_key, pool_maxsize=max_workers)
+        self.record = record_detail.Europeana(session=self.session, refresh=refresh)
 
     def fetch_europeana_data(self, **query_params):
         url = "https://api.europeana.eu/record/v2/search.json"
-        query_params['wskey'] = self.api_key
-        response = requests.get(url, params=query_params, timeout=30)
+        response = self.session.get(url, params=query_params, timeout=30)
         response.raise_for_status()
         return response.json()
 
@@ -72,7 +76,7 @@ class Europeana:
 
         item_id = record_object.get('id')
         try:
-            record = record_detail.Europeana()
+            record = self.record
             obj = record.record_detail(item_id)
 
             iiif = record.get_iiif_manifest(obj)
@@ -100,29 +104,36 @@ class Europeana:
             raise
 
     def get_all_collections(self, collections: list, savefile=True):
-        all_metadata = []
-
-        for collection in collections:
-            time.sleep(1)
-            print(f"Fetching metadata for collection: {collection}")
-            batch = self.get_metadata_by_collection(collection)
-            print(f"Got {len(batch)} items. Enriching with record details...")
-            for rec in batch:
-                time.sleep(0.15)
-                enriched = self.enrich_record(rec)
-                all_metadata.append(enriched)
+        # Search pages and record details share one pool, so every collection
+        # is in flight at once instead of one collection after another.
+        # Throttling is left to the session's Retry, which backs off on 429/503.
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            print(f"Fetching metadata for collections: {', '.join(collections)}")
+            batches = list(executor.map(self.get_metadata_by_collection, collections))
+            for collection, batch in zip(collections, batches):
+                print(f"Got {len(batch)} items from {collection}.")
+
+            print("Enriching with record details...")
+            records = [rec for batch in batches for rec in batch]
+            all_metadata = list(executor.map(self.enrich_record, records))
 
         print(f"Total records fetched: {len(all_metadata)}")
 
         if savefile:
             os.makedirs('static/data', exist_ok=True)
-            with open('static/data/europeana_metadata.json', 'w', encoding='utf-8') as file:
-                json.dump(all_metadata, file, indent=4, ensure_ascii=False)
+            Path('static/data/europeana_metadata.json').write_bytes(
+                orjson.dumps(all_metadata, option=orjson.OPT_INDENT_2)
+            )
         else:
             return all_metadata
 
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Harvest Europeana metadata into static/data.")
+    parser.add_argument("--refresh", action="store_true",
+                        help="ignore the record detail cache and fetch every record again")
+    args = parser.parse_args()
+
     collections = [
         'industrial',
         'art',
@@ -132,5 +143,5 @@ if __name__ == "__main__":
         'music'
     ]
 
-    europeana = Europeana()
+    europeana = Europeana(refresh=args.refresh)
     europeana.get_all_collections(collections, savefile=True)
\ No newline at end of file
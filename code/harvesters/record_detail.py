@@ -1,28 +1,86 @@
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 import dotenv
 import re
 import os
 import json
+import time
+import hashlib
+import threading
+from pathlib import Path
 from typing import Any, Dict, List, Optional
 
 dotenv.load_dotenv()
 
+API_VERSION = "v2"
+CACHE_DIR = Path("cache/europeana")
+CACHE_EXPIRE = 7 * 86400  # seconds before a cached record is revalidated
+
+_YEAR_RE = re.compile(r"\d{3,4}")
+_HASH_YEAR_RE = re.compile(r"#?\d{3,4}")
+
+def build_session(api_key, pool_connections=10, pool_maxsize=20):
+    """Create a keep-alive session for api.europeana.eu with the wskey preset."""
+    session = requests.Session()
+    retry = Retry(total=5, backoff_factor=0.5, status_forcelist=[429, 500, 502, 503, 504],
+                  respect_retry_after_header=True)
+    adapter = HTTPAdapter(pool_connections=pool_connections, pool_maxsize=pool_maxsize, max_retries=retry)
+    session.mount("https://", adapter)
+    session.params = {'wskey': api_key}
+    return session
+
 class Europeana:
-    def __init__(self):
+    def __init__(self, session=None, cache_dir=CACHE_DIR, refresh=False):
         self.api_key = dotenv.get_key(
             dotenv.find_dotenv(),
             "EUROPEANA_API_KEY"
         )
+        self.session = session or build_session(self.api_key)
+        self.cache_dir = Path(cache_dir)
+        self.refresh = refresh
+
+    def cache_path(self, record_id):
+        key = hashlib.sha1(f"{API_VERSION}:{record_id}".encode("utf-8")).hexdigest()
+        return self.cache_dir / key[:2] / f"{key}.json"
+
+    def write_cache(self, path, entry):
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_name(f"{path.name}.{threading.get_ident()}.tmp")
+        tmp.write_text(json.dumps(entry, ensure_ascii=False), encoding="utf-8")
+        os.replace(tmp, path)
 
     def record_detail(self, record_id):
-        url = f"https://api.europeana.eu/record/v2/{record_id}.json"
-        params = {
-            'wskey': self.api_key
-        }
-        response = requests.get(url, params=params, timeout=30)
+        """Fetch a record's 'object', served from the disk cache while fresh and revalidated by ETag after that."""
+        path = self.cache_path(record_id)
+        cached = None
+        if not self.refresh and path.exists():
+            cached = json.loads(path.read_text(encoding="utf-8"))
+            if time.time() - cached["fetched"] < CACHE_EXPIRE:
+                return cached["object"]
+
+        url = f"https://api.europeana.eu/record/{API_VERSION}/{record_id}.json"
+        headers = {}
+        if cached and cached.get("etag"):
+            headers["If-None-Match"] = cached["etag"]
+        response = self.session.get(url, headers=headers, timeout=30)
+
+        if response.status_code == 304 and cached:
+            cached["fetched"] = time.time()
+            self.write_cache(path, cached)
+            return cached["object"]
+
         response.raise_for_status()
         data = response.json()
-        return data.get('object', {})   
+        obj = data.get('object', {})
+        self.write_cache(path, {
+            "record_id": record_id,
+            "api_version": API_VERSION,
+            "etag": response.headers.get("ETag"),
+            "fetched": time.time(),
+            "object": obj,
+        })
+        return obj
     
     def pick_labels_by_language(self, record_object, langs=['en', 'es']):
         out = []
@@ -61,16 +119,16 @@ class Europeana:
                 date_end   = date_end   or end
             # Literal year sometimes sits in skosNotation/def
             lit = (ts.get("skosNotation") or {}).get("def", [None])[0]
-            if lit and re.fullmatch(r"\d{3,4}", lit):
+            if lit and _YEAR_RE.fullmatch(lit):
                 year = year or lit
 
         # Fallback: Europeana proxies often have 'year' or 'dcDate'
         for px in obj.get("proxies", []):
             y = (px.get("year") or {}).get("def", [None])[0]
-            if y and re.fullmatch(r"\d{3,4}", y):
+            if y and _YEAR_RE.fullmatch(y):
                 year = year or y
             d = (px.get("dcDate") or {}).get("def", [None])[0]
-            if d and re.fullmatch(r"#?\d{3,4}", d):
+            if d and _HASH_YEAR_RE.fullmatch(d):
                 year = year or d.lstrip("#")
 
         return {"year": year, "date_begin": date_begin, "date_end": date_end}
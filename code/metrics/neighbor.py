@@ -1,21 +1,20 @@
-import json
-import math
+import hashlib
 import os
 from pathlib import Path
 
+import joblib
 import numpy as np
+import orjson
 import pandas as pd
 from sklearn.feature_extraction.text import TfidfVectorizer
-from sklearn.metrics.pairwise import cosine_similarity
-from sklearn.preprocessing import MinMaxScaler
+from sklearn.preprocessing import normalize
 
 ##### Load Custom Gazetteer #####
-with open('static/data/gazetteer.json', 'r', encoding='utf-8') as f:
-    gazetteer = json.load(f)
+gazetteer = orjson.loads(Path('static/data/gazetteer.json').read_bytes())
 
 ##### Load metadata #####
 
-df = pd.read_json('static/data/europeana_metadata.json')
+df = pd.DataFrame(orjson.loads(Path('static/data/europeana_metadata.json').read_bytes()))
 
 def handle_scalar_values(func):
     def wrapper(value):
@@ -81,177 +80,197 @@ df = df[['id', 'title', 'description', 'concepts', 'year', 'date_begin', 'date_e
          'place_label', 'place_lat', 'place_lon', 'country', 'collection']]
 
 #### Handle missing coordinates using gazetteer #####
-for idx, row in df.iterrows():
-    if pd.notna(row['place_lat']) and pd.notna(row['place_lon']):
-        continue  # Coordinates already present
-    
-    place_name = row['place_label']
-    
-    if place_name and place_name in gazetteer:
-        gaz_entry = gazetteer[place_name]
-        df.at[idx, 'place_lat'] = gaz_entry.get('place_lat')
-        df.at[idx, 'place_lon'] = gaz_entry.get('place_lon')
+gaz_df = pd.DataFrame.from_dict(gazetteer, orient='index').rename_axis('place_label').reset_index()
+df = df.merge(gaz_df[['place_label', 'place_lat', 'place_lon']], on='place_label',
+              how='left', suffixes=('', '_gaz'), validate='many_to_one')
+
+# Only rows lacking coordinates take the gazetteer's, and then both of them
+fill = (df['place_lat'].isna() | df['place_lon'].isna()) & df['place_label'].isin(gazetteer.keys())
+df.loc[fill, 'place_lat'] = df.loc[fill, 'place_lat_gaz']
+df.loc[fill, 'place_lon'] = df.loc[fill, 'place_lon_gaz']
+df = df.drop(columns=['place_lat_gaz', 'place_lon_gaz'])
 
 #### Build text vectors #####
 
 df['text'] = df['title'] + ' ' + df['concepts'] + ' ' + df['description'] + ' ' + df['place_label']
 
-try:
-    vec = TfidfVectorizer(stop_words='english', max_features=5000, min_df=2)
-    X = vec.fit_transform(df['text'])
-    if X.shape[1] == 0:
-        raise ValueError("Empty vocabulary with min_df=2.")
-except Exception:
-    vec = TfidfVectorizer(stop_words='english', max_features=5000, min_df=1)
-    X = vec.fit_transform(df['text'])
+# Fitted vectorizer and matrix are cached per corpus, keyed on the text itself
+text_key = hashlib.sha1('\0'.join(df['text']).encode('utf-8')).hexdigest()
+tfidf_cache = Path('cache') / f'tfidf_{text_key}.pkl'
+
+if tfidf_cache.exists():
+    vec, X = joblib.load(tfidf_cache)
+else:
+    try:
+        vec = TfidfVectorizer(stop_words='english', max_features=5000, min_df=2)
+        X = vec.fit_transform(df['text'])
+        if X.shape[1] == 0:
+            raise ValueError("Empty vocabulary with min_df=2.")
+    except Exception:
+        vec = TfidfVectorizer(stop_words='english', max_features=5000, min_df=1)
+        X = vec.fit_transform(df['text'])
+    os.makedirs(tfidf_cache.parent, exist_ok=True)
+    joblib.dump((vec, X), tfidf_cache)
 
 # Cosine similarity of TF–IDF vectors of titles, descriptions, concepts.
-S_text = cosine_similarity(X)
+# S_text is never materialized: each row block Xn[i0:i1] @ Xn.T is computed
+# into a preallocated buffer when G is built.
+Xn = normalize(X).astype(np.float32).tocsr()
+Xn_T = Xn.T.tocsc()
 
 #### Build temporal similarity #####
 n = len(df)
-S_date = np.zeros((n,n), dtype=float)
+S_date = np.zeros((n,n), dtype=np.float32)
 
 # exponential kernel with 25 years bandwidth
 bandwidth = 25.0
 
-def get_temporal_range(row):
-    """
-    Extract temporal range for an item, using year, date_begin, and date_end.
-    Returns (min_year, max_year) tuple or (None, None) if no temporal info available.
-    """
-    year = row['year']
-    date_begin = row['date_begin']
-    date_end = row['date_end']
-    
-    # Priority 1: Use exact year if available
-    if not pd.isna(year):
-        return (year, year)
-    
-    # Priority 2: Use date range if both available
-    if not pd.isna(date_begin) and not pd.isna(date_end):
-        return (date_begin.year, date_end.year)
-    
-    # Priority 3: Use single date as point
-    if not pd.isna(date_begin):
-        return (date_begin.year, date_begin.year)
-    
-    if not pd.isna(date_end):
-        return (date_end.year, date_end.year)
-    
-    # No temporal information available
-    return (None, None)
+# Temporal range per item: exact year first, then date_begin/date_end,
+# falling back to whichever single date is present. NaN means no temporal info.
+years = df['year'].to_numpy(dtype=float)
+begin_years = df['date_begin'].dt.year.to_numpy(dtype=float)
+end_years = df['date_end'].dt.year.to_numpy(dtype=float)
+
+t_min = np.where(~np.isnan(years), years, np.where(~np.isnan(begin_years), begin_years, end_years))
+t_max = np.where(~np.isnan(years), years, np.where(~np.isnan(end_years), end_years, begin_years))
 
-def calculate_temporal_distance(t_min_i, t_max_i, t_min_j, t_max_j):
+def temporal_matrix(t_min, t_max, bandwidth, out, block=1024):
     """
-    Calculate minimum distance between two temporal ranges.
-    Returns 0 if ranges overlap.
+    Fill `out` with exp(-distance / bandwidth) between temporal ranges, where
+    distance is the gap between ranges and 0 when they overlap. Follows the
+    same upper-triangle row blocks as haversine_matrix; pairs involving an
+    item without temporal info (NaN) get 0.
     """
-    if t_max_i < t_min_j:
-        # Range i is entirely before range j
-        return t_min_j - t_max_i
-    elif t_max_j < t_min_i:
-        # Range j is entirely before range i
-        return t_min_i - t_max_j
-    else:
-        # Ranges overlap
-        return 0
-
-# Calculate temporal similarity matrix with range awareness
-for i in range(n):
-    t_min_i, t_max_i = get_temporal_range(df.iloc[i])
-    
-    if t_min_i is None:
-        continue  # No temporal info for item i
-    
-    for j in range(i, n):
-        t_min_j, t_max_j = get_temporal_range(df.iloc[j])
-        
-        if t_min_j is None:
-            continue  # No temporal info for item j
-        
-        # Calculate minimum distance between temporal ranges
-        distance = calculate_temporal_distance(t_min_i, t_max_i, t_min_j, t_max_j)
-        
-        # Apply exponential kernel
-        similarity = np.exp(-distance / bandwidth)
-        
-        S_date[i, j] = similarity
-        S_date[j, i] = similarity  # Symmetric matrix
+    n = len(t_min)
+    for i0 in range(0, n, block):
+        i1 = min(i0 + block, n)
+        after = t_min[None, i0:] - t_max[i0:i1, None]   # range i entirely before range j
+        before = t_min[i0:i1, None] - t_max[None, i0:]  # range j entirely before range i
+        d = np.where(after > 0, after, np.where(before > 0, before, 0.0))
+        d[np.isnan(after)] = np.inf  # exp(-inf) = 0: no temporal similarity
+        np.divide(d, -bandwidth, out=d)
+        np.exp(d, out=d)
+        out[i0:i1, i0:] = d
+        out[i0:, i0:i1] = d.T
+    return out
+
+temporal_matrix(t_min, t_max, bandwidth, out=S_date)
 
 #### Define spatial proximity #####
 
 def haversine(lat1, lon1, lat2, lon2):
+    """Great-circle distance in kilometers; arguments in radians, broadcast elementwise."""
     R = 6371.0  # Earth radius in kilometers
-    dlat = math.radians(lat2 - lat1)
-    dlon = math.radians(lon2 - lon1)
-    a = math.sin(dlat / 2)**2 + math.cos(math.radians(lat1))*math.cos(math.radians(lat2))*math.sin(dlon/2)**2
-    c = 2 * math.asin(math.sqrt(a))
-    return R * c
-
-coords = df[['place_lat', 'place_lon']].to_numpy()
-S_place = np.zeros((n,n), dtype=float)
+    dlat = lat2 - lat1
+    dlon = lon2 - lon1
+    a = np.sin(dlat / 2)**2 + np.cos(lat1) * np.cos(lat2) * np.sin(dlon / 2)**2
+    return 2 * R * np.arcsin(np.sqrt(a))
+
+def haversine_matrix(lat, lon, sigma, out, block=1024):
+    """
+    Fill `out` with exp(-d / sigma) for every pair of points (radians).
+    Works through row blocks of the upper triangle and mirrors each block,
+    so temporaries stay at block x n and every pair is computed once.
+    """
+    n = len(lat)
+    for i0 in range(0, n, block):
+        i1 = min(i0 + block, n)
+        d = haversine(lat[i0:i1, None], lon[i0:i1, None], lat[None, i0:], lon[None, i0:])
+        np.divide(d, -sigma, out=d)
+        np.exp(d, out=d)
+        out[i0:i1, i0:] = d
+        out[i0:, i0:i1] = d.T
+    return out
+
+coords = df[['place_lat', 'place_lon']].to_numpy(dtype=float)
+S_place = np.zeros((n,n), dtype=np.float32)
 sigma = 400.0  # bandwidth in kilometers
 
-for i in range(n):
-    lat1, lon1 = coords[i]
-    if pd.isna(lat1) or pd.isna(lon1):
-        continue
-    for j in range(i, n):
-        lat2, lon2 = coords[j]
-        if np.isnan(lat2) or np.isnan(lon2):
-            continue
-        d = haversine(lat1, lon1, lat2, lon2)
-        s = math.exp(-d / sigma)
-        S_place[i, j] = s
-        S_place[j, i] = s
+haversine_matrix(np.radians(coords[:, 0]), np.radians(coords[:, 1]), sigma, out=S_place)
+
+# Items without coordinates get no spatial similarity
+located = ~np.isnan(coords).any(axis=1)
+S_place[~(located[:, None] & located[None, :])] = 0.0
+
+def minmax_scale_columns(S):
+    """Rescale each column of S to [0, 1] in place, as MinMaxScaler does; constant columns become 0."""
+    mn = S.min(axis=0)
+    rng = S.max(axis=0) - mn
+    rng[rng == 0] = 1
+    np.subtract(S, mn, out=S)
+    np.divide(S, rng, out=S)
+    return S
 
 # Normalize similarity matrices to [0, 1]
 if n > 1:
-    scaler = MinMaxScaler()
-    S_date = scaler.fit_transform(S_date)
-    S_place = scaler.fit_transform(S_place)
+    minmax_scale_columns(S_date)
+    minmax_scale_columns(S_place)
 
 
 #### Create the Good Neihbor Index #####
 alpha, beta, gamma, delta = 0.5, 0.2, 0.2, 0.1 # predefined weights
 
 # Formula: G = α·S_text + β·S_date + γ·S_place + δ·S_user
-
-G = alpha * S_text + beta * S_date + gamma * S_place + delta * 0  # No user similarity for now
+# G is built one row block at a time and reduced to each row's top k right
+# away, so neither G nor the selection indices ever exist as full n x n arrays.
 
 # Build neighbors: top 50 neighbors for each record
 top_k = 50
+block = 1024
 neighbors = {}
 edges_rows = []
 
-for i, row in df.iterrows():
-    scores = G[i].copy()
-    scores[i] = -1  # exclude self
-    top_idx = np.argsort(scores)[-top_k:][::-1] # indices of top k neighbors
+k = min(top_k, n)
+top_idx = np.empty((n, k), dtype=np.intp)  # indices of top k neighbors
+top_scores = np.empty((n, k), dtype=np.float32)
+top_text = np.empty((n, k), dtype=np.float32)
+G_buf = np.empty((min(block, n), n), dtype=np.float32)
+text_buf = np.empty((min(block, n), n), dtype=np.float32)
+
+for i0 in range(0, n, block):
+    i1 = min(i0 + block, n)
+    G = G_buf[:i1 - i0]
+    text_block = (Xn[i0:i1] @ Xn_T).toarray(out=text_buf[:i1 - i0])
+    np.multiply(text_block, alpha, out=G)
+    G += beta * S_date[i0:i1]
+    G += gamma * S_place[i0:i1]
+    # delta * S_user: no user similarity for now
+    G[np.arange(i1 - i0), np.arange(i0, i1)] = -1  # exclude self
+
+    # Partial selection of the top k per row, then sort only those k by score
+    part = np.argpartition(G, -k, axis=1)[:, -k:]
+    part_scores = np.take_along_axis(G, part, axis=1)
+    order = np.argsort(-part_scores, axis=1)
+    top_idx[i0:i1] = np.take_along_axis(part, order, axis=1)
+    top_scores[i0:i1] = np.take_along_axis(part_scores, order, axis=1)
+    top_text[i0:i1] = np.take_along_axis(text_block, top_idx[i0:i1], axis=1)
+
+ids_arr = df['id'].to_numpy()
+titles_arr = df['title'].to_numpy()
+
+for i in range(n):
     items = []
-    for j in top_idx:
+    for j, score, s_text in zip(top_idx[i], top_scores[i], top_text[i]):
         items.append({
-            "id": df.loc[j, "id"],
-            "score": float(scores[j]),
-            "S_text": float(S_text[i, j]),
+            "id": ids_arr[j],
+            "score": float(score),
+            "S_text": float(s_text),
             "S_date": float(S_date[i, j]),
             "S_place": float(S_place[i, j]),
-            "title": df.loc[j, "title"]
+            "title": titles_arr[j]
         })
         edges_rows.append({
-            "source": df.loc[i, "id"],
-            "target": df.loc[j, "id"],
-            "G": float(scores[j]),
-            "S_text": float(S_text[i, j]),
+            "source": ids_arr[i],
+            "target": ids_arr[j],
+            "G": float(score),
+            "S_text": float(s_text),
             "S_date": float(S_date[i, j]),
             "S_place": float(S_place[i, j])
         })
-    neighbors[df.loc[i, "id"]] = items
+    neighbors[ids_arr[i]] = items
 
 # Save neighbors to JSON  
 out_dir = Path('static/data')
 os.makedirs(out_dir, exist_ok=True)
 
-with open(out_dir / 'europeana_neighbors.json', 'w', encoding='utf-8') as f:
-    json.dump(neighbors, f, ensure_ascii=False, indent=2)
\ No newline at end of file
+(out_dir / 'europeana_neighbors.json').write_bytes(orjson.dumps(neighbors, option=orjson.OPT_INDENT_2))
\ No newline at end of file
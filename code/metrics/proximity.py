@@ -2,7 +2,8 @@ import os
 import pandas as pd
 from sklearn.feature_extraction.text import TfidfVectorizer
 from sklearn.metrics.pairwise import cosine_similarity
-from sklearn.cluster import KMeans
+from sklearn.cluster import MiniBatchKMeans
+from sklearn.decomposition import TruncatedSVD
 from sklearn.manifold import TSNE
 import matplotlib.pyplot as plt
 
@@ -20,11 +21,15 @@ vec = TfidfVectorizer(stop_words='english', max_features=5000, min_df=2)
 X = vec.fit_transform(df['text'])
 
 k = 6
-km = KMeans(n_clusters=k, random_state=0).fit(X)
+km = MiniBatchKMeans(n_clusters=k, random_state=0, batch_size=1024, n_init='auto').fit(X)
 df['cluster'] = km.labels_
 
-tsne = TSNE(perplexity=15, random_state=0)
-xy = tsne.fit_transform(X.toarray())
+# Reduce the sparse TF-IDF matrix before t-SNE instead of densifying all 5000 columns
+svd = TruncatedSVD(n_components=min(50, X.shape[1] - 1), random_state=0)
+Xr = svd.fit_transform(X)
+
+tsne = TSNE(perplexity=15, random_state=0, init='pca', method='barnes_hut')
+xy = tsne.fit_transform(Xr)
 plt.figure(figsize=(10, 8))
 plt.scatter(xy[:,0], xy[:,1], c=df.cluster, cmap='tab10')
 plt.title('t-SNE visualization of Europeana records clusters')